@@ -1,13 +1,14 @@
 # evaluation_system/evaluation/run_evaluation.py
 import argparse
-import json
+import orjson # Faster JSON parsing/serialization than stdlib json
 import yaml
 from pathlib import Path
 from datetime import datetime
 import importlib
-import pandas as pd # For saving aggregated results
+import csv # For streaming aggregated results
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List
 
 # Add the parent directory to sys.path
@@ -16,6 +17,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from pipelines.executor import PipelineExecutor
 from metrics.base_metrics import BaseMetric # Corrected import
 
+# Columns of the aggregated summary CSV (the keys of the metadata returned by save_results)
+SUMMARY_COLUMNS = ["pdf_filename", "pipeline_name", "run_timestamp", "total_cost",
+                   "total_latency", "success", "metrics", "stages"]
+
+# Indented like json.dump(..., indent=2); non-str dict keys are stringified as json.dump did,
+# numpy values are serialized natively (NaN/Infinity are written as null)
+JSON_DUMP_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
 # --- Helper Functions ---
 
 def load_ground_truth(gt_base_path: Path, pdf_filename: str) -> Dict[str, Any]:
@@ -28,13 +37,14 @@ def load_ground_truth(gt_base_path: Path, pdf_filename: str) -> Dict[str, Any]:
     gt_data = {}
     if json_path.exists():
         try:
-            with open(json_path, 'r') as f:
-                gt_data = json.load(f)
+            with open(json_path, 'rb') as f:
+                gt_data = orjson.loads(f.read())
                 
             # For text accuracy metrics, also provide concatenated text for simpler comparison
             if "content_units" in gt_data:
-                concatenated_text = "\n".join([unit["text"] for unit in gt_data["content_units"]])
-                gt_data["text"] = concatenated_text
+                unit_texts = [unit["text"] for unit in gt_data["content_units"]]
+                gt_data["text"] = "\n".join(unit_texts)
+                gt_data["_unit_texts"] = unit_texts # Reused by unit-level metrics on every call
                 
             print(f"    Ground truth loaded successfully with {len(gt_data.get('content_units', []))} content units")
         except Exception as e:
@@ -44,43 +54,86 @@ def load_ground_truth(gt_base_path: Path, pdf_filename: str) -> Dict[str, Any]:
     
     return gt_data
 
+def _resolve_metric_class(mc: Dict) -> type:
+    """Imports the metric class named by a metric config entry."""
+    module_path = mc['metric_module']
+    class_name = mc['metric_class']
+    module = importlib.import_module(module_path)
+    metric_class = getattr(module, class_name)
+    if not issubclass(metric_class, BaseMetric):
+        raise TypeError(f"{class_name} is not a subclass of BaseMetric")
+    return metric_class
+
+def validate_metric_configs(metric_configs: List[Dict]) -> List[Dict]:
+    """Checks that each metric class can be resolved, without instantiating it. Returns the valid configs."""
+    valid_configs = []
+    print("  Validating metrics...")
+    for mc in metric_configs:
+        try:
+            _resolve_metric_class(mc)
+            valid_configs.append(mc)
+            print(f"    Found metric: {mc['metric_class']}")
+        except (ImportError, AttributeError, KeyError, TypeError) as e:
+            print(f"    Error loading metric {mc}: {e}")
+    return valid_configs
+
 def load_metrics(metric_configs: List[Dict]) -> List[BaseMetric]:
     """Dynamically loads and instantiates specified metric classes."""
     metrics = []
     print("  Loading metrics...")
     for mc in metric_configs:
         try:
-            module_path = mc['metric_module']
-            class_name = mc['metric_class']
-            params = mc.get('params', {})
-            module = importlib.import_module(module_path)
-            metric_class = getattr(module, class_name)
-            if not issubclass(metric_class, BaseMetric):
-                raise TypeError(f"{class_name} is not a subclass of BaseMetric")
-            instance = metric_class(config=params)
+            metric_class = _resolve_metric_class(mc)
+            instance = metric_class(config=mc.get('params', {}))
             metrics.append(instance)
             print(f"    Loaded metric: {instance.name}")
         except (ImportError, AttributeError, KeyError, TypeError) as e:
             print(f"    Error loading metric {mc}: {e}")
     return metrics
 
-def calculate_all_metrics(metrics: List[BaseMetric], prediction: Any, ground_truth: Dict[str, Any]) -> Dict[str, Any]:
-    """Runs all loaded metrics."""
-    metric_results = {}
+def _calculate_metric(metric: BaseMetric, predictions: List[Any], ground_truths: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Runs a single metric over a batch. If the batch call fails, falls back to scoring
+    item by item so only the predictions that fail themselves record None.
+    """
+    try:
+        # Determine which part of GT the metric needs
+        # This might require conventions or config in the metric itself
+        # Example: if metric.name == 'text_edit_distance': gt = ground_truth.get('text')
+        # For simplicity here, pass all GT. Metrics must handle missing keys.
+        scores = metric.calculate_batch(predictions, ground_truths)
+    except Exception as e:
+        print(f"    Error calculating metric {metric.name} in batch, retrying per item: {e}")
+        scores = []
+        for prediction, ground_truth in zip(predictions, ground_truths):
+            try:
+                scores.append(metric.calculate(prediction, ground_truth))
+            except Exception as e:
+                print(f"    Error calculating metric {metric.name}: {e}")
+                scores.append(None) # Or specific error value
+    for score in scores:
+        print(f"      {metric.name}: {score}")
+    return scores
+
+def calculate_all_metrics(metrics: List[BaseMetric], predictions: List[Any], ground_truth: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Runs all loaded metrics over a batch of predictions for the same document,
+    concurrently in threads when there is more than one metric.
+    :return: One {metric_name: score} dictionary per prediction.
+    """
     print("    Calculating metrics...")
-    for metric in metrics:
-        try:
-            # Determine which part of GT the metric needs
-            # This might require conventions or config in the metric itself
-            # Example: if metric.name == 'text_edit_distance': gt = ground_truth.get('text')
-            # For simplicity here, pass all GT. Metrics must handle missing keys.
-            score = metric.calculate(prediction, ground_truth)
-            metric_results[metric.name] = score
-            print(f"      {metric.name}: {score}")
-        except Exception as e:
-            print(f"    Error calculating metric {metric.name}: {e}")
-            metric_results[metric.name] = None # Or specific error value
-    return metric_results
+    ground_truths = [ground_truth] * len(predictions)
+    if len(metrics) <= 1:
+        scores = {metric.name: _calculate_metric(metric, predictions, ground_truths) for metric in metrics}
+    else:
+        # Metrics backed by C code (RapidFuzz, numpy) or remote APIs release the GIL, so threads overlap them
+        scores = {}
+        with ThreadPoolExecutor(max_workers=min(len(metrics), 8)) as pool:
+            futures = {pool.submit(_calculate_metric, metric, predictions, ground_truths): metric for metric in metrics}
+            for future in as_completed(futures):
+                scores[futures[future].name] = future.result()
+    return [{metric.name: scores[metric.name][i] for metric in metrics} # Keep config order
+            for i in range(len(predictions))]
 
 def save_results(output_dir: Path, pipeline_name: str, run_ts: str, pdf_filename: str,
                  pipeline_output: Dict, metrics_output: Dict):
@@ -93,9 +146,10 @@ def save_results(output_dir: Path, pipeline_name: str, run_ts: str, pdf_filename
     # Save final structured output (used for metrics)
     final_output_path = doc_results_dir / "final_output.json"
     try:
-        # Assuming final output is JSON serializable
-        with open(final_output_path, 'w') as f:
-            json.dump(pipeline_output.get('final_output', None), f, indent=2)
+        # Assuming final output is JSON serializable (orjson.JSONEncodeError subclasses TypeError)
+        final_output_json = orjson.dumps(pipeline_output.get('final_output', None), option=JSON_DUMP_OPTIONS)
+        with open(final_output_path, 'wb') as f:
+            f.write(final_output_json)
     except TypeError as e:
          print(f"    Warning: Could not serialize final output to JSON: {e}")
          # Fallback: save as string or handle differently
@@ -111,18 +165,71 @@ def save_results(output_dir: Path, pipeline_name: str, run_ts: str, pdf_filename
         "total_latency": pipeline_output.get('total_latency'),
         "success": pipeline_output.get('success'),
         "metrics": metrics_output,
-        "stages": [ # Save stage costs/latencies, omit large outputs
-            {k: v for k, v in stage.items() if k != 'output'}
-            for stage in pipeline_output.get('stages', [])
-        ]
+        "stages": pipeline_output.get('stages', []) # Stage costs/latencies
     }
     metadata_path = doc_results_dir / "metadata.json"
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    with open(metadata_path, 'wb') as f:
+        f.write(orjson.dumps(metadata, option=JSON_DUMP_OPTIONS))
 
     return metadata # Return metadata for aggregation
 
 
+def _list_pdfs(category_path: Path) -> List[Path]:
+    """Returns the sorted PDF files directly inside category_path (empty if it does not exist)."""
+    if not category_path.is_dir():
+        return []
+    with os.scandir(category_path) as entries:
+        return sorted(Path(e.path) for e in entries if e.is_file() and e.name.endswith('.pdf'))
+
+# Per-process state, set up once in each worker by _init_worker
+_worker_executors: List[PipelineExecutor] = []
+_worker_metrics: List[BaseMetric] = []
+
+def _init_worker(executors: List[PipelineExecutor], metrics_cfg: List[Dict]):
+    """Stores the pipeline executors and builds the metric instances once per worker process."""
+    global _worker_executors, _worker_metrics
+    _worker_executors = executors
+    _worker_metrics = load_metrics(metrics_cfg)
+
+def _process_one_pdf(pdf_path: Path, gt_base_path: Path, results_base_path: Path, run_ts: str) -> List[Dict[str, Any]]:
+    """
+    Runs every pipeline on one PDF, scores the outputs and saves the results.
+    Kept at module level so it can be pickled and run in a worker process; ground truth
+    is loaded once and shared by all pipelines.
+    :return: The document metadata for each pipeline that ran, for aggregation.
+    """
+    print(f"\n  Processing PDF: {pdf_path.name}")
+
+    # Load Ground Truth
+    ground_truth = load_ground_truth(gt_base_path, pdf_path.name)
+    if not ground_truth:
+        print(f"    Warning: No ground truth found for {pdf_path.name}. Skipping metrics.")
+        return []
+
+    pipeline_runs = []
+    for executor in _worker_executors:
+        pipeline_name = executor.pipeline_name
+        context = {
+            "pdf_path": str(pdf_path),
+            "run_id": run_ts,
+            "pipeline_name": pipeline_name
+        }
+        try:
+            # Run Pipeline
+            pipeline_runs.append((pipeline_name, executor.run(initial_input=str(pdf_path), context=context)))
+        except Exception as e:
+            print(f"Error processing {pdf_path.name} with pipeline {pipeline_name}: {e}")
+            continue # Move to next pipeline
+
+    # Calculate Metrics for every pipeline's output in one batch (they share this PDF's ground truth)
+    predictions = [pipeline_result.get('final_output') for _, pipeline_result in pipeline_runs] # Or specific structured output
+    all_metrics = calculate_all_metrics(_worker_metrics, predictions, ground_truth)
+
+    # Save Individual Results
+    return [save_results(results_base_path, pipeline_name, run_ts, pdf_path.name, pipeline_result, metrics_result)
+            for (pipeline_name, pipeline_result), metrics_result in zip(pipeline_runs, all_metrics)]
+
+
 # --- Main Execution Logic ---
 
 def main(args):
@@ -138,9 +245,9 @@ def main(args):
     pdf_limit = eval_config.get('pdf_limit_per_category', None)
     metrics_to_run = eval_config.get('metrics', [])
 
-    # Load metrics
-    metrics = load_metrics(metrics_to_run)
-    if not metrics:
+    # Validate metrics; instances are built once per worker process
+    metrics_to_run = validate_metric_configs(metrics_to_run)
+    if not metrics_to_run:
         print("No metrics loaded. Exiting.")
         return
 
@@ -163,75 +270,84 @@ def main(args):
         return
 
     run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    all_aggregated_results = []
 
     print(f"\n=== Starting Evaluation Run: {run_timestamp} ===")
 
+    # Parse each pipeline config once; the executors are shipped to every worker
+    executors = []
     for pipeline_config_path in pipelines_to_run:
         try:
             executor = PipelineExecutor(pipeline_config_path)
-            pipeline_name = executor.pipeline_name
-            print(f"\n--- Evaluating Pipeline: {pipeline_name} ---")
-
-            # Find PDFs to process
-            pdfs_processed_count = 0
-            for category in dataset_categories:
-                category_path = data_base_path / category
-                print(f"  Processing category: {category}...")
-                category_pdfs = sorted(list(category_path.glob("*.pdf")))
-                limit = pdf_limit
-
-                if not category_pdfs:
-                    print(f"    No PDFs found in {category_path}")
-                    continue
-
-                for pdf_path in category_pdfs:
-                    if limit is not None and limit <= 0:
-                        break # Reached limit for this category
-
-                    print(f"\n  Processing PDF: {pdf_path.name}")
-                    context = {
-                        "pdf_path": str(pdf_path),
-                        "run_id": run_timestamp,
-                        "pipeline_name": pipeline_name
-                    }
-
-                    # Load Ground Truth
-                    ground_truth = load_ground_truth(gt_base_path, pdf_path.name)
-                    if not ground_truth:
-                        print(f"    Warning: No ground truth found for {pdf_path.name}. Skipping metrics.")
-                        # Optionally run pipeline anyway if needed for just cost/latency
-                        # pipeline_result = executor.run(initial_input=str(pdf_path), context=context)
-                        continue # Skip if GT is required for metrics
-
-                    # Run Pipeline
-                    pipeline_result = executor.run(initial_input=str(pdf_path), context=context)
-
-                    # Calculate Metrics
-                    prediction_output = pipeline_result.get('final_output') # Or specific structured output
-                    metrics_result = calculate_all_metrics(metrics, prediction_output, ground_truth)
-
-                    # Save Individual Results
-                    doc_metadata = save_results(results_base_path, pipeline_name, run_timestamp, pdf_path.name,
-                                                pipeline_result, metrics_result)
-                    all_aggregated_results.append(doc_metadata)
-
-                    if limit is not None:
-                        limit -= 1
-                    pdfs_processed_count += 1
-
+            print(f"  Loaded pipeline: {executor.pipeline_name}")
+            executors.append(executor)
         except (FileNotFoundError, ValueError, ImportError) as e:
             print(f"Error setting up pipeline {pipeline_config_path.stem}: {e}")
             continue # Move to next pipeline
 
-    # Save aggregated results
-    if all_aggregated_results:
-        agg_df = pd.DataFrame(all_aggregated_results)
-        # Optionally flatten metrics dictionary
-        # agg_df = pd.concat([agg_df.drop(['metrics'], axis=1), agg_df['metrics'].apply(pd.Series)], axis=1)
-        agg_filename = results_base_path / "aggregated" / f"summary_{run_timestamp}.csv"
-        agg_filename.parent.mkdir(parents=True, exist_ok=True)
-        agg_df.to_csv(agg_filename, index=False)
+    # Find PDFs to process (one directory scan per category for the whole run)
+    pdf_index = {category: _list_pdfs(data_base_path / category) for category in dataset_categories}
+    pdfs_to_process = []
+    for category in dataset_categories:
+        category_path = data_base_path / category
+        print(f"  Processing category: {category}...")
+        category_pdfs = pdf_index[category]
+        limit = pdf_limit
+
+        if not category_pdfs:
+            print(f"    No PDFs found in {category_path}")
+            continue
+
+        for pdf_path in category_pdfs:
+            if limit is not None and limit <= 0:
+                break # Reached limit for this category
+
+            if not (gt_base_path / f"{pdf_path.stem}.json").exists():
+                print(f"    Warning: No ground truth found for {pdf_path.name}. Skipping metrics.")
+                continue # Skip if GT is required for metrics
+
+            pdfs_to_process.append(pdf_path)
+            if limit is not None:
+                limit -= 1
+
+    # Aggregated results are appended row by row as documents finish, so memory stays flat
+    # and partial results survive a crash. The file is only created once there is a row to write.
+    agg_filename = results_base_path / "aggregated" / f"summary_{run_timestamp}.csv"
+    agg_file = None
+    writer = None
+    rows_written = 0
+
+    # PDFs are independent, so each one runs (through every pipeline) in a worker process
+    max_workers = eval_config.get('max_workers', os.cpu_count())
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(executors, metrics_to_run)) as pool:
+            futures = {
+                pool.submit(_process_one_pdf, pdf_path, gt_base_path, results_base_path, run_timestamp): pdf_path
+                for pdf_path in pdfs_to_process
+            }
+            for future in as_completed(futures):
+                pdf_path = futures[future]
+                try:
+                    all_metadata = future.result()
+                except Exception as e:
+                    print(f"Error processing {pdf_path.name}: {e}")
+                    continue
+                if not all_metadata:
+                    continue
+                if writer is None:
+                    agg_filename.parent.mkdir(parents=True, exist_ok=True)
+                    agg_file = open(agg_filename, 'w', newline='')
+                    writer = csv.DictWriter(agg_file, fieldnames=SUMMARY_COLUMNS, extrasaction='ignore')
+                    writer.writeheader()
+                for doc_metadata in all_metadata:
+                    writer.writerow(doc_metadata)
+                    rows_written += 1
+                agg_file.flush()
+    finally:
+        if agg_file is not None:
+            agg_file.close()
+
+    if rows_written:
         print(f"\nAggregated results saved to: {agg_filename}")
 
     print(f"\n=== Evaluation Run {run_timestamp} Complete ===")
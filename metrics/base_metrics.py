@@ -1,6 +1,6 @@
 # evaluation_system/metrics/base_metric.py
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Union
+from typing import Any, Dict, List, Union
 
 class BaseMetric(ABC):
     """Abstract base class for evaluation metrics."""
@@ -22,6 +22,16 @@ class BaseMetric(ABC):
         """
         pass
 
+    def calculate_batch(self, predictions: List[Any], ground_truths: List[Any]) -> List[Union[float, Dict[str, float]]]:
+        """
+        Calculate the metric for paired predictions and ground truths.
+        Defaults to calling calculate() per pair; metrics with a vectorized path override this.
+        :param predictions: Outputs produced by the pipelines/tools.
+        :param ground_truths: The corresponding ground truth data, one per prediction.
+        :return: One score (float or dictionary) per pair.
+        """
+        return [self.calculate(p, gt) for p, gt in zip(predictions, ground_truths)]
+
     @property
     @abstractmethod
     def name(self) -> str:
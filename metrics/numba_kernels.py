@@ -0,0 +1,48 @@
+# evaluation_ruminate/metrics/numba_kernels.py
+from typing import List, Tuple
+import numpy as np
+from numba import njit, prange # Requires pip install numba
+
+
+def to_code_points(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs strings into one flat uint32 code-point array plus offsets, the layout the kernels expect.
+    :return: (flat, offsets) where text i is flat[offsets[i]:offsets[i + 1]].
+    """
+    arrays = [np.frombuffer(t.encode("utf-32-le"), dtype=np.uint32) for t in texts]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(a) for a in arrays])
+    flat = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint32)
+    return flat, offsets
+
+
+@njit(parallel=True, cache=True)
+def pairwise_lev(preds_flat, pred_offsets, gts_flat, gt_offsets, out):
+    """
+    Fills out[i, j] with the Levenshtein distance between prediction i and GT j.
+    Rows run in parallel (prange, no GIL); each pair uses an explicit two-row DP, which
+    numba compiles to tighter code than vectorized numpy would.
+    """
+    n_pred = len(pred_offsets) - 1
+    n_gt = len(gt_offsets) - 1
+    max_gt_len = 0
+    for j in range(n_gt):
+        max_gt_len = max(max_gt_len, gt_offsets[j + 1] - gt_offsets[j])
+
+    for i in prange(n_pred):
+        a = preds_flat[pred_offsets[i]:pred_offsets[i + 1]]
+        prev = np.empty(max_gt_len + 1, dtype=np.int32)
+        cur = np.empty(max_gt_len + 1, dtype=np.int32)
+        for j in range(n_gt):
+            b = gts_flat[gt_offsets[j]:gt_offsets[j + 1]]
+            m = len(b)
+            for y in range(m + 1):
+                prev[y] = y
+            for x in range(len(a)):
+                cur[0] = x + 1
+                ax = a[x]
+                for y in range(m):
+                    cost = 0 if ax == b[y] else 1
+                    cur[y + 1] = min(prev[y + 1] + 1, cur[y] + 1, prev[y] + cost)
+                prev, cur = cur, prev
+            out[i, j] = prev[m]
@@ -1,11 +1,26 @@
 # evaluation_ruminate/metrics/text_accuracy.py
-from typing import Any, Dict, Union, List
-import Levenshtein # Requires pip install python-Levenshtein
+import math
+from typing import Any, Dict, Union, List, Optional, Tuple
+import numpy as np
+from rapidfuzz import process # Requires pip install rapidfuzz
+from rapidfuzz.distance import Levenshtein as RF_Lev
+from scipy.optimize import linear_sum_assignment
 
 from .base_metrics import BaseMetric
 
 class TextEditDistance(BaseMetric):
-    """Calculates Levenshtein distance between predicted and ground truth text."""
+    """
+    Calculates Levenshtein distance between predicted and ground truth text.
+    Config:
+      unit_backend: "rapidfuzz" (default) or "numba" - how the pairwise content-unit cost matrix is computed.
+        "numba" is optional and requires pip install numba.
+      workers: 1 (default) - threads used by the RapidFuzz/numba batch calls (-1 = all cores). Evaluation
+        already runs one process per core, so more threads only oversubscribe the CPU there.
+      length_ratio_cutoff: 0.95 (default) - if the texts' length difference exceeds this fraction of the
+        longer text, skip the DP and report the longer length as the distance. None disables it.
+      cutoff_ratio: None (default) - if set, stop the DP once the distance exceeds cutoff_ratio * longer
+        length (at least 1) and report the longer length as the distance, like length_ratio_cutoff.
+    """
 
     @property
     def name(self) -> str:
@@ -20,19 +35,8 @@ class TextEditDistance(BaseMetric):
         """
         results = {}
         
-        # Extract raw text from prediction (either direct text string or inside dict)
-        pred_text = ""
-        if isinstance(prediction, str):
-            pred_text = prediction
-        elif isinstance(prediction, dict) and "text" in prediction:
-            pred_text = prediction["text"]
-        
-        # Extract ground truth text
-        if not isinstance(ground_truth, dict) or "text" not in ground_truth:
-            print(f"Warning: Ground truth for {self.name} missing 'text' key.")
-            gt_text = ""
-        else:
-            gt_text = ground_truth["text"]
+        pred_text = self._pred_text(prediction)
+        gt_text = self._gt_text(ground_truth)
         
         # Calculate raw text distance
         if not gt_text and not pred_text:
@@ -40,7 +44,7 @@ class TextEditDistance(BaseMetric):
             results["normalized_distance"] = 0.0
         else:
             try:
-                distance = Levenshtein.distance(pred_text, gt_text)
+                distance = self._text_distance(pred_text, gt_text)
                 results["raw_text_distance"] = float(distance)
                 # Normalize by the length of ground truth text
                 max_len = max(len(gt_text), 1)  # Avoid division by zero
@@ -51,25 +55,156 @@ class TextEditDistance(BaseMetric):
                 results["normalized_distance"] = -1.0
         
         # If both prediction and ground truth have content_units, compare those too
-        if (isinstance(prediction, dict) and "content_units" in prediction and 
-            isinstance(ground_truth, dict) and "content_units" in ground_truth):
-            
-            pred_units = prediction["content_units"]
-            gt_units = ground_truth["content_units"]
-            
-            # Calculate content unit distances - simplified approach for now
-            # For a more sophisticated approach, you might want to align units first
-            unit_distances = []
-            
-            # Calculate distance between concatenated unit texts
-            pred_concat = "\n".join([u.get("text", "") for u in pred_units if isinstance(u, dict)])
-            gt_concat = "\n".join([u.get("text", "") for u in gt_units if isinstance(u, dict)])
-            
-            unit_distance = Levenshtein.distance(pred_concat, gt_concat)
-            max_unit_len = max(len(gt_concat), 1)
+        unit_texts = self._unit_texts(prediction, ground_truth)
+        if unit_texts is not None:
+            pred_unit_texts, gt_unit_texts = unit_texts
+            unit_distance = self._aligned_unit_distance(pred_unit_texts, gt_unit_texts)
+            max_unit_len = max(sum(len(t) for t in gt_unit_texts), 1)
             unit_normalized = unit_distance / max_unit_len
             
             results["unit_text_distance"] = float(unit_distance)
             results["unit_normalized_distance"] = unit_normalized
             
-        return results
\ No newline at end of file
+        return results
+
+    def calculate_batch(self, predictions: List[Any], ground_truths: List[Any]) -> List[Dict[str, float]]:
+        """
+        Scores paired predictions/ground truths at once; same per-item results as calculate().
+        :return: One result dictionary per (prediction, ground_truth) pair.
+        """
+        arrays = self.batch_distances(predictions, ground_truths)
+        results = []
+        for i in range(len(predictions)):
+            item = {key: float(values[i]) for key, values in arrays.items() if not np.isnan(values[i])}
+            results.append(item)
+        return results
+
+    def batch_distances(self, predictions: List[Any], ground_truths: List[Any]) -> Dict[str, np.ndarray]:
+        """
+        Vectorized form of calculate() over paired predictions/ground truths.
+        Raw text distances come from one RapidFuzz cpdist call (C++, threaded per the workers param) and are
+        normalized with numpy; unit distances are NaN for pairs without content_units on both sides.
+        :return: Dictionary of per-pair arrays, keyed like calculate()'s results.
+        """
+        pred_texts = [self._pred_text(p) for p in predictions]
+        gt_texts = [self._gt_text(g) for g in ground_truths]
+        pred_lens = np.array([len(t) for t in pred_texts], dtype=np.int64)
+        gt_lens = np.array([len(t) for t in gt_texts], dtype=np.int64)
+        max_lens = np.maximum(pred_lens, gt_lens)
+
+        # Same short-circuits as _text_distance, applied to the whole batch
+        distances = max_lens.astype(np.float64)
+        length_ratio_cutoff = self.config.get("length_ratio_cutoff", 0.95)
+        needs_dp = np.ones(len(pred_texts), dtype=bool)
+        if length_ratio_cutoff is not None:
+            needs_dp = np.abs(pred_lens - gt_lens) / np.maximum(max_lens, 1) <= length_ratio_cutoff
+        dp_idx = np.flatnonzero(needs_dp)
+        if dp_idx.size:
+            cutoff_ratio = self.config.get("cutoff_ratio")
+            caps = None if cutoff_ratio is None else np.maximum(np.ceil(max_lens[dp_idx] * cutoff_ratio), 1).astype(np.int64)
+            dp_distances = process.cpdist(
+                [pred_texts[i] for i in dp_idx], [gt_texts[i] for i in dp_idx],
+                scorer=RF_Lev.distance, workers=self.config.get("workers", 1),
+                score_cutoff=None if caps is None else int(caps.max()))
+            if caps is not None:
+                # Past its own cap a pair is reported as max_len, never below the true distance
+                dp_distances = np.where(dp_distances > caps, max_lens[dp_idx], dp_distances)
+            distances[dp_idx] = dp_distances
+
+        unit_distances = np.full(len(pred_texts), np.nan)
+        unit_gt_lens = np.ones(len(pred_texts), dtype=np.int64)
+        for i, (prediction, ground_truth) in enumerate(zip(predictions, ground_truths)):
+            unit_texts = self._unit_texts(prediction, ground_truth)
+            if unit_texts is not None:
+                pred_unit_texts, gt_unit_texts = unit_texts
+                unit_distances[i] = self._aligned_unit_distance(pred_unit_texts, gt_unit_texts)
+                unit_gt_lens[i] = sum(len(t) for t in gt_unit_texts)
+
+        # Normalize by the length of ground truth text, avoiding division by zero
+        return {
+            "raw_text_distance": distances,
+            "normalized_distance": distances / np.maximum(gt_lens, 1),
+            "unit_text_distance": unit_distances,
+            "unit_normalized_distance": unit_distances / np.maximum(unit_gt_lens, 1),
+        }
+
+    def _pred_text(self, prediction: Any) -> str:
+        """Extracts raw text from prediction (either direct text string or inside dict)."""
+        if isinstance(prediction, str):
+            return prediction # Common case (e.g. plain extractor output), no conversion needed
+        if isinstance(prediction, dict):
+            return prediction.get("text") or ""
+        return "" if prediction is None else str(prediction)
+
+    def _gt_text(self, ground_truth: Any) -> str:
+        """Extracts ground truth text (either direct text string or inside dict)."""
+        if isinstance(ground_truth, str):
+            return ground_truth
+        if isinstance(ground_truth, dict) and ground_truth.get("text") is not None:
+            return ground_truth["text"]
+        print(f"Warning: Ground truth for {self.name} missing 'text' key.")
+        return ""
+
+    def _unit_texts(self, prediction: Any, ground_truth: Any) -> Optional[Tuple[List[str], List[str]]]:
+        """Returns (pred_unit_texts, gt_unit_texts), or None unless both sides have content_units."""
+        if not (isinstance(prediction, dict) and "content_units" in prediction and
+                isinstance(ground_truth, dict) and "content_units" in ground_truth):
+            return None
+        pred_unit_texts = [u.get("text", "") for u in prediction["content_units"] if isinstance(u, dict)]
+        gt_unit_texts = ground_truth.get("_unit_texts") # Precomputed by the GT loader
+        if gt_unit_texts is None:
+            gt_unit_texts = [u.get("text", "") for u in ground_truth["content_units"] if isinstance(u, dict)]
+        return pred_unit_texts, gt_unit_texts
+
+    def _text_distance(self, pred_text: str, gt_text: str) -> int:
+        """Levenshtein distance between the raw texts, short-circuited for degenerate outputs."""
+        max_len = max(len(gt_text), len(pred_text))
+        length_ratio_cutoff = self.config.get("length_ratio_cutoff", 0.95)
+        if length_ratio_cutoff is not None and abs(len(gt_text) - len(pred_text)) / max_len > length_ratio_cutoff:
+            # distance >= the length difference, so it is already within a few % of max_len
+            return max_len
+
+        cutoff_ratio = self.config.get("cutoff_ratio")
+        if cutoff_ratio is None:
+            return RF_Lev.distance(pred_text, gt_text)
+        # RapidFuzz prunes the bit-parallel DP and returns score_cutoff + 1 once the cutoff is exceeded
+        score_cutoff = max(1, math.ceil(max_len * cutoff_ratio))
+        distance = RF_Lev.distance(pred_text, gt_text, score_cutoff=score_cutoff)
+        # Past the cutoff the true distance is unknown, so report the upper bound max_len
+        return max_len if distance > score_cutoff else distance
+
+    def _aligned_unit_distance(self, pred_unit_texts: List[str], gt_unit_texts: List[str]) -> int:
+        """
+        Aligns predicted units to GT units one-to-one (Hungarian assignment) and returns the
+        total edit cost: matched pairs cost their edit distance, and units left without a
+        partner count as fully inserted/deleted.
+        """
+        pred_lens = np.array([len(t) for t in pred_unit_texts], dtype=np.int64)
+        gt_lens = np.array([len(t) for t in gt_unit_texts], dtype=np.int64)
+        unmatched_total = int(pred_lens.sum() + gt_lens.sum())
+        if not pred_unit_texts or not gt_unit_texts:
+            return unmatched_total
+
+        # Assign on what matching a pair saves versus leaving both units unmatched, so the
+        # insert/delete cost of unmatched units is part of the optimization (with unequal
+        # unit counts, assigning on raw pair costs would rather drop a long unit than match it)
+        costs = self._unit_cost_matrix(pred_unit_texts, gt_unit_texts).astype(np.int64)
+        savings = costs - pred_lens[:, None] - gt_lens[None, :]
+        rows, cols = linear_sum_assignment(savings)
+        return unmatched_total + int(savings[rows, cols].sum())
+
+    def _unit_cost_matrix(self, pred_unit_texts: List[str], gt_unit_texts: List[str]) -> np.ndarray:
+        """Returns the NxM matrix of pairwise edit distances between predicted and GT units."""
+        if self.config.get("unit_backend", "rapidfuzz") == "numba":
+            import numba # numba is optional
+            from .numba_kernels import to_code_points, pairwise_lev
+            preds_flat, pred_offsets = to_code_points(pred_unit_texts)
+            gts_flat, gt_offsets = to_code_points(gt_unit_texts)
+            workers = self.config.get("workers", 1)
+            if workers != -1:
+                numba.set_num_threads(min(workers, numba.config.NUMBA_NUM_THREADS))
+            costs = np.empty((len(pred_unit_texts), len(gt_unit_texts)), dtype=np.int32)
+            pairwise_lev(preds_flat, pred_offsets, gts_flat, gt_offsets, costs)
+            return costs
+        # Filled in C++ outside the GIL (in parallel threads if workers != 1)
+        return process.cdist(pred_unit_texts, gt_unit_texts, scorer=RF_Lev.distance, workers=self.config.get("workers", 1))
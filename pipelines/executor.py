@@ -1,6 +1,9 @@
 # evaluation_system/pipelines/executor.py
 import yaml
+import json
+import copy
 import importlib
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
 import sys
@@ -11,6 +14,17 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from tools.base_tool import BaseTool # Now should be importable
 
+try:
+    from yaml import CSafeLoader as SafeLoader # libyaml-backed, much faster than the pure-Python loader
+except ImportError:
+    from yaml import SafeLoader
+
+@lru_cache(maxsize=None)
+def _load_pipeline_cfg(path_str: str, mtime: float) -> Dict[str, Any]:
+    """Parses a pipeline config; cached per (path, mtime) so edits to the file are picked up."""
+    with open(path_str, 'r') as f:
+        return yaml.load(f, Loader=SafeLoader)
+
 class PipelineExecutor:
     def __init__(self, pipeline_config_path: Path):
         """
@@ -20,15 +34,15 @@ class PipelineExecutor:
         if not pipeline_config_path.exists():
             raise FileNotFoundError(f"Pipeline config not found: {pipeline_config_path}")
 
-        with open(pipeline_config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        # Copy so an executor can never mutate the cached config
+        self.config = copy.deepcopy(_load_pipeline_cfg(str(pipeline_config_path), pipeline_config_path.stat().st_mtime))
 
         if not self.config or 'pipeline_name' not in self.config or 'stages' not in self.config:
             raise ValueError(f"Invalid pipeline config format in {pipeline_config_path}")
 
         self.pipeline_name = self.config['pipeline_name']
         self.stages = self.config['stages']
-        self._tools_cache = {} # Cache instantiated tools if needed
+        self._tools_cache = {} # Tool instances keyed by (module, class, config)
 
     def _get_tool_instance(self, tool_module_path: str, tool_class_name: str, tool_config: Dict) -> BaseTool:
         """Dynamically imports and instantiates a tool."""
@@ -39,12 +53,13 @@ class PipelineExecutor:
             tool_class = getattr(module, tool_class_name)
             if not issubclass(tool_class, BaseTool):
                  raise TypeError(f"{tool_class_name} is not a subclass of BaseTool")
-            # You might want to cache instances if tools are stateless and config is the same
-            # key = (tool_module_path, tool_class_name, str(tool_config))
-            # if key not in self._tools_cache:
-            #    self._tools_cache[key] = tool_class(config=tool_config)
-            # return self._tools_cache[key]
-            return tool_class(config=tool_config) # Instantiate anew each time for simplicity here
+            if not getattr(tool_class, '_cacheable', True):
+                return tool_class(config=tool_config) # Stateful tool, instantiate anew each time
+            # Reuse instances across documents so expensive __init__ work (model loads, clients) is paid once
+            key = (tool_module_path, tool_class_name, json.dumps(tool_config, sort_keys=True, default=str))
+            if key not in self._tools_cache:
+                self._tools_cache[key] = tool_class(config=tool_config)
+            return self._tools_cache[key]
         except (ImportError, AttributeError, TypeError) as e:
             print(f"Error loading tool {tool_class_name} from {tool_module_path}: {e}")
             raise
@@ -57,7 +72,7 @@ class PipelineExecutor:
         :return: Dictionary containing results:
                  {'pipeline_name': str,
                   'final_output': Any,
-                  'stages': [{'name': str, 'output': Any, 'cost': float, 'latency': float}],
+                  'stages': [{'name': str, 'cost': float, 'latency': float}],
                   'total_cost': float,
                   'total_latency': float}
         """
@@ -83,9 +98,9 @@ class PipelineExecutor:
                 output_data, cost, latency = tool_instance.run(current_data, context)
 
                 print(f"  Stage {stage_name} completed: Latency={latency:.4f}s, Cost={cost:.6f}")
+                # Intermediate outputs are not retained; only current_data is handed to the next stage
                 stage_results.append({
                     'name': stage_name,
-                    'output': output_data, # Caution: storing large intermediate outputs
                     'cost': cost,
                     'latency': latency
                 })
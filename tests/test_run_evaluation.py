@@ -0,0 +1,17 @@
+# evaluation_ruminate/tests/test_run_evaluation.py
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from evaluation.run_evaluation import calculate_all_metrics
+from metrics.text_accuracy import TextEditDistance
+
+
+def test_failing_prediction_does_not_wipe_other_scores():
+    ground_truth = {"text": "x", "content_units": [{"text": "x"}]}
+    bad_prediction = {"text": "x", "content_units": [{"text": None}]}
+    results = calculate_all_metrics([TextEditDistance()], ["x", bad_prediction], ground_truth)
+    assert results[0]["text_edit_distance"] == {"raw_text_distance": 0.0, "normalized_distance": 0.0}
+    assert results[1]["text_edit_distance"] is None
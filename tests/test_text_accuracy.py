@@ -0,0 +1,18 @@
+# evaluation_ruminate/tests/test_text_accuracy.py
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics.text_accuracy import TextEditDistance
+
+
+def test_unit_alignment_with_unequal_unit_counts():
+    # hello<->"hello world" (6) + unmatched "foo" (3) beats hello<->foo (4) + unmatched "hello world" (11)
+    assert TextEditDistance()._aligned_unit_distance(["hello"], ["hello world", "foo"]) == 9
+    assert TextEditDistance()._aligned_unit_distance(["hello world", "foo"], ["hello"]) == 9
+
+
+def test_unit_alignment_without_units_on_one_side():
+    assert TextEditDistance()._aligned_unit_distance([], ["abc", "de"]) == 5
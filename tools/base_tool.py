@@ -6,6 +6,10 @@ from typing import Any, Dict, Tuple
 class BaseTool(ABC):
     """Abstract base class for all processing tools in the pipeline."""
 
+    # PipelineExecutor reuses one instance per (tool, config); set to False for tools
+    # that keep per-document state and must be instantiated anew for every run
+    _cacheable = True
+
     def __init__(self, config: Dict[str, Any]):
         """
         Initialize the tool with its specific configuration.
@@ -36,6 +40,7 @@ class BaseTool(ABC):
         :return: Tuple containing (processed_output, cost, latency).
         """
         self._cost = 0.0  # Reset cost for this run
+        self._latency = 0.0
         start_time = time.monotonic()
         
         try:
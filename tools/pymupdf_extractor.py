@@ -10,6 +10,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from .base_tool import BaseTool
 
+# PyMuPDF's default text flags, plus joining words hyphenated across line breaks
+TEXT_FLAGS = fitz.TEXTFLAGS_TEXT | fitz.TEXT_DEHYPHENATE
+
 class PyMuPDFExtractor(BaseTool):
     """Extracts plain text from a PDF using PyMuPDF."""
 
@@ -25,32 +28,41 @@ class PyMuPDFExtractor(BaseTool):
 
         pdf_path = Path(pdf_path_str)
         document_id = pdf_path.stem
-        concatenated_text = ""
+        text_parts = []
         content_units = []
         
         try:
-            doc = fitz.open(pdf_path)
-            unit_count = 0
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                page_text = page.get_text("text")
-                concatenated_text += page_text + "\n--- Page Break ---\n"
-                
-                # For this simple example, we'll treat each paragraph (text separated by empty lines)
-                # as a separate content unit
-                paragraphs = [p.strip() for p in page_text.split('\n\n') if p.strip()]
-                
-                for para in paragraphs:
-                    unit_count += 1
-                    content_units.append({
-                        "unit_id": f"unit_{unit_count}",
-                        "text": para,
-                        "source_page_start": page_num + 1,
-                        "source_page_end": page_num + 1
-                    })
+            with fitz.open(pdf_path) as doc: # Closes the file on failure paths too
+                for page_num, page in enumerate(doc):
+                    # One structured extraction per page yields both the plain text and the
+                    # content units (same text as get_text("text") / get_text("blocks"))
+                    page_dict = page.get_text("dict", flags=TEXT_FLAGS)
+                    blocks = [
+                        (block["bbox"], "".join(
+                            "".join(span["text"] for span in line["spans"]) + "\n"
+                            for line in block["lines"]
+                        ))
+                        for block in page_dict["blocks"] if block["type"] == 0 # Skip image blocks
+                    ]
+                    text_parts.extend(block_text for _, block_text in blocks)
+
+                    # Use PyMuPDF's own text blocks as content units, skipping empty ones
+                    content_units.extend([
+                        {
+                            "unit_id": None, # Assigned once all pages are extracted
+                            "text": block_text.strip(),
+                            "source_page_start": page_num + 1,
+                            "source_page_end": page_num + 1,
+                            "bbox": list(bbox)
+                        }
+                        for bbox, block_text in blocks if block_text.strip()
+                    ])
+                    text_parts.append("\n--- Page Break ---\n")
                     
-            doc.close()
+            # Number units in a single pass
+            for i, unit in enumerate(content_units, 1):
+                unit["unit_id"] = f"unit_{i}"
+            concatenated_text = "".join(text_parts) # Single allocation instead of += per page
             # Basic cost/latency is handled by the base class run method
             # No specific API cost here, so self._cost remains 0 unless set otherwise
         except Exception as e: